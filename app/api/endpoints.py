@@ -1,10 +1,14 @@
 """
 Endpoints da API FastAPI
 """
+import asyncio
 import logging
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, status
+import uuid
+from datetime import datetime
+from typing import Awaitable, List, Optional, TypeVar
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Depends, status
 from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
 
 from ..models.schemas import (
     EmailAnalysisRequest, 
@@ -15,109 +19,174 @@ from ..models.schemas import (
     ErrorResponse,
     EmailClassification
 )
-from ..services.ai_classifier import email_classifier
-from ..services.openai_classifier import openai_classifier
 from ..services.file_processor import file_processor
 from ..services.data_storage import data_storage
+from ..services.batcher import batcher, local_batcher
+from ..services.cache import response_cache
 from ..core.config import settings
+from ..utils.responses import UTCORJSONResponse
 
 logger = logging.getLogger(__name__)
 
+# Configurações lidas por requisição, resolvidas uma única vez no import
+# (as configurações só mudam com o reinício do processo, inclusive no reload do modo debug)
+USE_OPENAI = settings.use_openai and bool(settings.openai_api_key)
+CLASSIFIER_MODEL = settings.openai_model if USE_OPENAI else "local"
+MAX_CONTENT_LENGTH = settings.max_content_length
+APP_NAME = settings.app_name
+APP_VERSION = settings.app_version
+
 # Router principal
 router = APIRouter()
 
+# Documentação das rotas que retornam modelos já validados, sem response_model.
+# São serializados direto pelo orjson (timestamps UTC com sufixo Z).
+ANALYSIS_RESPONSES = {200: {"model": EmailAnalysisResponse}}
+HEALTH_RESPONSES = {200: {"model": HealthResponse}}
+HISTORY_RESPONSES = {200: {"model": List[EmailHistory]}}
+
+# Adapter criado uma única vez para serializar listas de histórico
+HISTORY_ADAPTER = TypeAdapter(List[EmailHistory])
+
+# Intervalo de verificação de desconexão do cliente durante a classificação
+DISCONNECT_POLL_INTERVAL = 0.2
+CLIENT_CLOSED_REQUEST = 499
+
+T = TypeVar("T")
+
+
+async def _wait_for_disconnect(http_request: Request) -> None:
+    """Retorna quando o cliente encerra a conexão"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def _cancel_on_disconnect(http_request: Request, awaitable: Awaitable[T]) -> T:
+    """Aguarda o resultado, cancelando-o se o cliente desconectar antes"""
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(_wait_for_disconnect(http_request))
+    
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+    
+    if task not in done:
+        logger.info("Cliente desconectou - classificação cancelada")
+        raise HTTPException(
+            status_code=CLIENT_CLOSED_REQUEST,
+            detail="Requisição encerrada pelo cliente"
+        )
+    
+    return task.result()
+
+
+async def _classify_content(content: str, file_name: Optional[str]) -> EmailAnalysisResponse:
+    """Classifica o conteúdo usando o cache, a OpenAI (em lote) ou o classificador local"""
+    cached = await response_cache.get(content, CLASSIFIER_MODEL)
+    if cached:
+        logger.info("Classificação recuperada do cache")
+        # Reaproveitar a classificação, mas registrar como uma nova análise
+        return cached.model_copy(update={
+            "id": str(uuid.uuid4()),
+            "analysis_timestamp": datetime.utcnow(),
+            "file_name": file_name
+        })
+    
+    # Classificar email usando OpenAI ou fallback (ambos agrupados em lotes)
+    if USE_OPENAI:
+        analysis = await batcher.submit(content, file_name)
+    else:
+        analysis = await local_batcher.submit(content, file_name)
+    
+    # Respostas de fallback (ex.: falha temporária da OpenAI) não são reaproveitadas
+    if not analysis.degraded:
+        await response_cache.set(content, CLASSIFIER_MODEL, analysis)
+    return analysis
 
-@router.get("/health", response_model=HealthResponse)
+
+@router.get("/health", response_class=UTCORJSONResponse, responses=HEALTH_RESPONSES)
 async def health_check():
     """Health check do sistema"""
-    return HealthResponse(
+    return UTCORJSONResponse(HealthResponse(
         status="healthy",
-        app_name=settings.app_name,
-        version=settings.app_version
-    )
+        app_name=APP_NAME,
+        version=APP_VERSION
+    ).model_dump())
 
 
-@router.post("/analyze", response_model=EmailAnalysisResponse)
-async def analyze_email(request: EmailAnalysisRequest):
+@router.post("/analyze", response_class=UTCORJSONResponse, responses=ANALYSIS_RESPONSES)
+async def analyze_email(request: EmailAnalysisRequest, http_request: Request):
     """Analisa conteúdo de email via texto direto"""
     try:
-        logger.info(f"Analisando email via texto direto - {len(request.content)} caracteres")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Analisando email via texto direto - %d caracteres", len(request.content))
         
-        # Classificar email usando OpenAI ou fallback
-        if settings.use_openai and settings.openai_api_key:
-            analysis = await openai_classifier.classify_email(
-                content=request.content,
-                file_name=request.file_name
-            )
-        else:
-            analysis = email_classifier.classify_email(
-                content=request.content,
-                file_name=request.file_name
-            )
+        analysis = await _cancel_on_disconnect(
+            http_request, _classify_content(request.content, request.file_name)
+        )
         
         # Armazenar resultado
-        data_storage.store_analysis(analysis, request.content)
+        await data_storage.store_analysis(analysis, request.content)
         
-        logger.info(f"Análise concluída - ID: {analysis.id}, Classificação: {analysis.classification}")
+        logger.info("Análise concluída - ID: %s, Classificação: %s", analysis.id, analysis.classification)
         
-        return analysis
+        # A análise já foi validada ao ser criada: serializar direto com orjson
+        return UTCORJSONResponse(analysis.model_dump())
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erro na análise de email: {str(e)}")
+        logger.error("Erro na análise de email: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno na análise do email"
         )
 
 
-@router.post("/analyze/file", response_model=EmailAnalysisResponse)
-async def analyze_email_file(file: UploadFile = File(...)):
+@router.post("/analyze/file", response_class=UTCORJSONResponse, responses=ANALYSIS_RESPONSES)
+async def analyze_email_file(http_request: Request, file: UploadFile = File(...)):
     """Analisa email a partir de arquivo enviado"""
     try:
-        logger.info(f"Analisando email via arquivo: {file.filename}")
+        logger.info("Analisando email via arquivo: %s", file.filename)
         
-        # Extrair texto do arquivo
-        content, filename = await file_processor.extract_text_from_file(file)
+        # Extrair texto do arquivo (lendo apenas o necessário para a análise)
+        content, filename = await file_processor.extract_text_from_file(
+            file, max_chars=MAX_CONTENT_LENGTH
+        )
         
         # Truncar se necessário
         content = file_processor.truncate_text_for_analysis(content)
         
-        logger.info(f"Texto extraído do arquivo - {len(content)} caracteres")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Texto extraído do arquivo - %d caracteres", len(content))
         
-        # Classificar email usando OpenAI ou fallback
-        if settings.use_openai and settings.openai_api_key:
-            analysis = await openai_classifier.classify_email(
-                content=content,
-                file_name=filename
-            )
-        else:
-            analysis = email_classifier.classify_email(
-                content=content,
-                file_name=filename
-            )
+        analysis = await _cancel_on_disconnect(http_request, _classify_content(content, filename))
         
         # Armazenar resultado
-        data_storage.store_analysis(analysis, content)
+        await data_storage.store_analysis(analysis, content)
         
-        logger.info(f"Análise de arquivo concluída - ID: {analysis.id}, Classificação: {analysis.classification}")
+        logger.info("Análise de arquivo concluída - ID: %s, Classificação: %s", analysis.id, analysis.classification)
         
-        return analysis
+        return UTCORJSONResponse(analysis.model_dump())
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro na análise de arquivo: {str(e)}")
+        logger.error("Erro na análise de arquivo: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno na análise do arquivo"
         )
 
 
-@router.get("/analysis/{analysis_id}", response_model=EmailAnalysisResponse)
+@router.get("/analysis/{analysis_id}", response_class=UTCORJSONResponse, responses=ANALYSIS_RESPONSES)
 async def get_analysis(analysis_id: str):
     """Recupera uma análise específica por ID"""
     try:
-        analysis = data_storage.get_analysis(analysis_id)
+        analysis = await data_storage.get_analysis(analysis_id)
         
         if not analysis:
             raise HTTPException(
@@ -125,40 +194,34 @@ async def get_analysis(analysis_id: str):
                 detail="Análise não encontrada"
             )
         
-        return analysis
+        return UTCORJSONResponse(analysis.model_dump())
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao recuperar análise {analysis_id}: {str(e)}")
+        logger.error("Erro ao recuperar análise %s: %s", analysis_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno ao recuperar análise"
         )
 
 
-@router.get("/history", response_model=List[EmailHistory])
+@router.get("/history", response_class=UTCORJSONResponse, responses=HISTORY_RESPONSES)
 async def get_history(
     limit: int = 50,
     classification: Optional[EmailClassification] = None
 ):
     """Recupera histórico de análises"""
     try:
-        if classification:
-            # Filtrar por classificação
-            history = data_storage.get_analysis_by_classification(classification)
-            # Aplicar limite
-            history = history[-limit:] if len(history) > limit else history
-            history.reverse()  # Mais recentes primeiro
-        else:
-            # Recuperar todos
-            history = data_storage.get_history(limit)
+        # Filtro, limite e ordenação (mais recentes primeiro) feitos no armazenamento
+        history = await data_storage.get_history(limit, classification)
         
-        logger.info(f"Histórico recuperado - {len(history)} itens")
-        return history
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Histórico recuperado - %d itens", len(history))
+        return UTCORJSONResponse(HISTORY_ADAPTER.dump_python(history))
         
     except Exception as e:
-        logger.error(f"Erro ao recuperar histórico: {str(e)}")
+        logger.error("Erro ao recuperar histórico: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno ao recuperar histórico"
@@ -169,12 +232,12 @@ async def get_history(
 async def get_stats():
     """Recupera estatísticas do sistema"""
     try:
-        stats = data_storage.get_stats()
-        logger.info(f"Estatísticas recuperadas - Total: {stats.total_processed}")
+        stats = await data_storage.get_stats()
+        logger.info("Estatísticas recuperadas - Total: %d", stats.total_processed)
         return stats
         
     except Exception as e:
-        logger.error(f"Erro ao recuperar estatísticas: {str(e)}")
+        logger.error("Erro ao recuperar estatísticas: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno ao recuperar estatísticas"
@@ -185,7 +248,7 @@ async def get_stats():
 async def clear_history():
     """Limpa todo o histórico e estatísticas"""
     try:
-        success = data_storage.clear_history()
+        success = await data_storage.clear_history()
         
         if success:
             logger.info("Histórico limpo com sucesso")
@@ -199,7 +262,7 @@ async def clear_history():
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao limpar histórico: {str(e)}")
+        logger.error("Erro ao limpar histórico: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno ao limpar histórico"
@@ -210,8 +273,8 @@ async def clear_history():
 async def root():
     """Endpoint raiz da API"""
     return {
-        "message": f"Bem-vindo ao {settings.app_name}",
-        "version": settings.app_version,
+        "message": f"Bem-vindo ao {APP_NAME}",
+        "version": APP_VERSION,
         "docs": "/docs",
         "health": "/health"
     }
@@ -2,8 +2,10 @@
 Configurações do aplicativo FastAPI
 """
 
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
 from typing import List
+import multiprocessing
 import os
 
 
@@ -17,6 +19,11 @@ class Settings(BaseSettings):
     # Configurações de servidor
     host: str = "0.0.0.0"
     port: int = 8000
+    # Processos do servidor fora do modo debug; 0 = automático (ver get_worker_count).
+    # WEB_CONCURRENCY é o nome usado por várias plataformas de hospedagem; WORKERS tem precedência
+    workers: int = Field(0, validation_alias=AliasChoices("WORKERS", "WEB_CONCURRENCY"))
+    server_loop: str = "uvloop"  # Use "auto" em plataformas sem uvloop (Windows)
+    server_http: str = "httptools"
     # CORS
     allowed_origins: List[str] = [
         "http://localhost:3000",
@@ -30,6 +37,7 @@ class Settings(BaseSettings):
 
     # Configurações de IA
     model_name: str = "distilbert-base-uncased"
+    classifier_model_path: str = ""  # Pipeline scikit-learn (joblib); vazio usa palavras-chave
     max_content_length: int = 10000  # Máximo de caracteres por email
     confidence_threshold: float = 0.7
 
@@ -40,6 +48,11 @@ class Settings(BaseSettings):
     # Configurações de banco de dados (para futuro uso)
     database_url: str = "sqlite:///./emails.db"
 
+    # Configurações do Redis (cache e armazenamento compartilhado)
+    redis_url: str = ""  # Vazio desativa o Redis
+    cache_ttl_seconds: int = 86400
+    analysis_ttl_seconds: int = 7 * 86400  # Análises completas consultáveis por ID
+
     # Configurações de logs
     log_level: str = "INFO"
 
@@ -47,6 +60,26 @@ class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_model: str = "gpt-3.5-turbo"
     use_openai: bool = True  # Flag para usar OpenAI ou classificador local
+    openai_max_keepalive_connections: int = 32  # Conexões HTTP ociosas mantidas abertas com a API da OpenAI
+
+    # Configurações de micro-batching das chamadas de classificação
+    max_batch_size: int = 1  # Máximo de emails por chamada à OpenAI (1 = sem agrupar requisições)
+    max_batch_chars: int = 20000  # Máximo de caracteres somados dos emails de um lote
+    max_batch_latency_ms: int = 20  # Janela de espera para agrupar requisições
+    concurrency_threshold: int = 2  # Tamanho mínimo do lote para usar uma única chamada
+
+    def get_worker_count(self) -> int:
+        """Quantidade de processos do servidor (Uvicorn ou Gunicorn)"""
+        # Sem Redis, cada processo teria seu próprio histórico em memória: usar um único worker
+        if not self.redis_url:
+            if self.workers > 1:
+                raise ValueError(
+                    f"WORKERS/WEB_CONCURRENCY={self.workers} exige REDIS_URL para compartilhar análises, histórico e estatísticas"
+                )
+            return 1
+        
+        # Com Redis: um processo por núcleo (x2 + 1), salvo configuração explícita
+        return self.workers or multiprocessing.cpu_count() * 2 + 1
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,39 @@
+"""
+Cliente Redis compartilhado entre os serviços
+"""
+import logging
+from typing import Optional, Any
+
+try:
+    from redis import asyncio as aioredis
+except Exception:  # pragma: no cover
+    aioredis = None
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[Any] = None
+
+
+def get_redis() -> Optional[Any]:
+    """Retorna o cliente Redis compartilhado, ou None se o Redis não estiver configurado"""
+    global _client
+
+    if _client is None and settings.redis_url:
+        if aioredis is None:
+            logger.warning("REDIS_URL configurada, mas o pacote redis não está instalado")
+            return None
+        _client = aioredis.from_url(settings.redis_url, decode_responses=True)
+        logger.info("Cliente Redis inicializado")
+
+    return _client
+
+
+async def close_redis() -> None:
+    """Fecha a conexão com o Redis, se aberta"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -2,9 +2,11 @@
 Aplicação principal FastAPI - AutoU Email Classifier
 """
 import os
+import re
 import sys
 import logging
 from contextlib import asynccontextmanager
+from time import monotonic_ns
 
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if current_dir not in sys.path:
@@ -12,13 +14,19 @@ if current_dir not in sys.path:
 
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
+from starlette.datastructures import URL
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .core.config import settings
 from .api.endpoints import router
 from .models.schemas import ErrorResponse
+from .utils.responses import UTCORJSONResponse
+from .core.redis_client import close_redis
+from .services.batcher import batcher, local_batcher
+from .services.data_storage import data_storage
+from .services.openai_classifier import openai_classifier
 
 # Configurar logging
 logging.basicConfig(
@@ -38,11 +46,21 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Iniciando {settings.app_name} v{settings.app_version}")
     logger.info(f"Modo debug: {settings.debug}")
+    batcher.start()
+    local_batcher.start()
+    data_storage.start()
+    # Gerar o schema OpenAPI antes de atender requisições
+    app.openapi_schema = build_openapi_schema()
     logger.info("Sistema de classificação de emails inicializado")
     
     yield
     
     # Shutdown
+    await batcher.stop()
+    await local_batcher.stop()
+    await data_storage.stop()
+    await openai_classifier.close()
+    await close_redis()
     logger.info("Encerrando aplicação")
 
 
@@ -82,6 +100,7 @@ app = FastAPI(
         "url": "https://opensource.org/licenses/MIT",
     },
     lifespan=lifespan,
+    default_response_class=UTCORJSONResponse,
     debug=settings.debug
 )
 
@@ -98,35 +117,32 @@ def get_allowed_origins():
             "https://autou-email-classifier-git-master.vercel.app"
         ]
         origins.extend(vercel_patterns)
-        
-        # Para desenvolvimento, permitir qualquer subdomínio .vercel.app
-        # Em produção, você deve especificar domínios exatos por segurança
-        if settings.debug:
-            origins.append("https://*.vercel.app")
     
     return origins
 
+
+# Origins calculadas uma única vez no startup
+ALLOWED_ORIGINS = tuple(get_allowed_origins())
+_ALLOWED_ORIGINS_SET = frozenset(ALLOWED_ORIGINS)
+
+# Localhost em qualquer porta e, se habilitado, qualquer subdomínio .vercel.app (previews)
+ALLOWED_ORIGIN_REGEX = r"http://(localhost|127\.0\.0\.1)(:\d+)?"
+if settings.allow_vercel_origins:
+    ALLOWED_ORIGIN_REGEX += r"|https://.*\.vercel\.app"
+_ALLOWED_ORIGIN_RE = re.compile(ALLOWED_ORIGIN_REGEX)
+
 def vercel_origin_check(origin: str) -> bool:
-    """Verifica se origin é de um domínio Vercel válido"""
+    """Verifica se origin é permitida (lista fixa, localhost ou domínio Vercel)"""
     if not origin:
         return False
     
-    # Permitir localhost sempre
-    if "localhost" in origin or "127.0.0.1" in origin:
-        return True
-    
-    # Verificar se é um domínio .vercel.app
-    if settings.allow_vercel_origins and origin.endswith(".vercel.app"):
-        # Você pode adicionar validações mais específicas aqui se necessário
-        return True
-    
-    return origin in settings.allowed_origins
+    return origin in _ALLOWED_ORIGINS_SET or _ALLOWED_ORIGIN_RE.fullmatch(origin) is not None
 
-# Aplicar CORS com validação customizada
+# Aplicar CORS com as mesmas regras de vercel_origin_check
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[],
-    allow_origin_regex=r".*",
+    allow_origins=list(ALLOWED_ORIGINS),
+    allow_origin_regex=ALLOWED_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
@@ -136,10 +152,8 @@ app.add_middleware(
 app.include_router(router, prefix="/api/v1")
 
 # Documentação customizada
-def custom_openapi():
-    if app.openapi_schema:
-        return app.openapi_schema
-    
+def build_openapi_schema() -> dict:
+    """Gera o schema OpenAPI customizado (executado uma vez no startup)"""
     openapi_schema = get_openapi(
         title=settings.app_name,
         version=settings.app_version,
@@ -154,29 +168,52 @@ def custom_openapi():
         "url": "https://via.placeholder.com/120x120/007acc/ffffff?text=AutoU"
     }
     
-    app.openapi_schema = openapi_schema
+    return openapi_schema
+
+
+def custom_openapi():
+    """Retorna o schema pré-computado no startup (ou gerado e guardado no primeiro acesso)"""
+    if app.openapi_schema is None:
+        app.openapi_schema = build_openapi_schema()
     return app.openapi_schema
 
 app.openapi = custom_openapi
 
 
 # Middleware para logging de requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
+class RequestLoggingMiddleware:
     """Log de todas as requisições"""
-    start_time = __import__('time').time()
-    
-    # Log da requisição
-    logger.info(f"Request: {request.method} {request.url}")
-    
-    # Processar requisição
-    response = await call_next(request)
+    # Middleware ASGI puro: o BaseHTTPMiddleware (@app.middleware) encapsula o receive e
+    # impede que os endpoints percebam a desconexão do cliente
     
-    # Log da resposta
-    process_time = __import__('time').time() - start_time
-    logger.info(f"Response: {response.status_code} - {process_time:.3f}s")
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = monotonic_ns()
+        status_code = None
+        
+        # Log da requisição
+        logger.info("Request: %s %s", scope["method"], URL(scope=scope))
+        
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        # Processar requisição
+        await self.app(scope, receive, send_with_status)
+        
+        # Log da resposta
+        logger.info("Response: %s - %.3fs", status_code, (monotonic_ns() - start_time) / 1e9)
+
+
+app.add_middleware(RequestLoggingMiddleware)
 
 
 # Handler global de exceções
@@ -185,12 +222,12 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """Handler para exceções HTTP"""
     logger.error(f"HTTP Exception: {exc.status_code} - {exc.detail}")
     
-    return JSONResponse(
+    return UTCORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
             detail=f"Erro {exc.status_code}"
-        ).dict()
+        ).model_dump()
     )
 
 
@@ -199,12 +236,12 @@ async def general_exception_handler(request: Request, exc: Exception):
     """Handler para exceções gerais"""
     logger.error(f"Unhandled Exception: {str(exc)}", exc_info=True)
     
-    return JSONResponse(
+    return UTCORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(
             error="Erro interno do servidor",
             detail="Ocorreu um erro inesperado. Tente novamente."
-        ).dict()
+        ).model_dump()
     )
 
 
@@ -255,5 +292,8 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
+        workers=None if settings.debug else settings.get_worker_count(),
+        loop=settings.server_loop,
+        http=settings.server_http,
         log_level=settings.log_level.lower()
     )
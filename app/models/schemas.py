@@ -2,7 +2,7 @@
 Schemas Pydantic para validação de dados da API
 """
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -45,12 +45,22 @@ class EmailAnalysisResponse(BaseModel):
     )
     suggested_response: str = Field(..., description="Resposta sugerida")
     analysis_timestamp: datetime = Field(
-        default_factory=datetime.now, description="Timestamp da análise"
+        default_factory=datetime.utcnow, description="Timestamp da análise"
     )
     file_name: Optional[str] = Field(None, description="Nome do arquivo analisado")
 
-    class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    # Análise gerada por fallback ou resposta de emergência (não é serializado)
+    _degraded: bool = PrivateAttr(default=False)
+
+    @property
+    def degraded(self) -> bool:
+        """Indica se a análise veio de um caminho degradado e não deve ser reaproveitada"""
+        return self._degraded
+
+    def mark_degraded(self) -> "EmailAnalysisResponse":
+        """Marca a análise como degradada"""
+        self._degraded = True
+        return self
 
 
 class EmailHistory(BaseModel):
@@ -84,10 +94,7 @@ class HealthResponse(BaseModel):
     status: str = "healthy"
     app_name: str
     version: str
-    timestamp: datetime = Field(default_factory=datetime.now)
-
-    class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
 class ErrorResponse(BaseModel):
@@ -95,7 +102,4 @@ class ErrorResponse(BaseModel):
 
     error: str = Field(..., description="Mensagem de erro")
     detail: Optional[str] = Field(None, description="Detalhes adicionais do erro")
-    timestamp: datetime = Field(default_factory=datetime.now)
-
-    class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
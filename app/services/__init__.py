@@ -6,3 +6,5 @@ from .ai_classifier import email_classifier
 from .openai_classifier import openai_classifier
 from .file_processor import file_processor
 from .data_storage import data_storage
+from .batcher import batcher, local_batcher
+from .cache import response_cache
@@ -1,158 +1,437 @@
 """
 Serviço de classificação de emails usando IA
 """
+import os
 import re
 import uuid
-from typing import Tuple
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 import logging
 
+try:
+    import joblib
+    import numpy as np
+except Exception:  # pragma: no cover
+    joblib = None
+    np = None
+
+try:
+    import ahocorasick
+except Exception:  # pragma: no cover
+    ahocorasick = None
+
 from ..models.schemas import EmailClassification, EmailAnalysisResponse
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Sequências de caracteres especiais e espaços, substituídas por um único espaço
+# no pré-processamento (equivale a remover os especiais e depois os espaços extras)
+_SEPARATOR_RE = re.compile(r'[^\w\?\!]+')
+
+# Quantidade de classificações memorizadas (LRU)
+CLASSIFICATION_CACHE_SIZE = 4096
+# Conteúdos maiores que isso são indexados pelo hash, limitando a memória das chaves
+CACHE_KEY_MAX_LENGTH = 256
+
+# (classificação, confiança, resposta sugerida)
+ClassificationResult = Tuple[EmailClassification, float, str]
+
+
+# Palavras-chave por categoria
+_PRODUCTIVE_KEYWORDS = {
+    # Ações diretas
+    'action': ('ação', 'fazer', 'implementar', 'desenvolver', 'criar', 'modificar', 'alterar', 'corrigir'),
+    'urgency': ('urgente', 'importante', 'prioridade', 'deadline', 'prazo', 'imediato'),
+    'request': ('solicito', 'preciso', 'necessário', 'requer', 'pedido', 'solicitação'),
+    'meeting': ('reunião', 'meeting', 'encontro', 'agenda', 'agendamento', 'horário'),
+    'decision': ('decisão', 'aprovar', 'autorizar', 'confirmar', 'validar', 'aceitar'),
+    'problem': ('problema', 'erro', 'bug', 'falha', 'defeito', 'issue'),
+    'question': ('pergunta', 'dúvida', 'questão', 'esclarecimento', 'como', 'quando', 'onde'),
+    'response_needed': ('resposta', 'responder', 'retorno', 'feedback', 'confirmação')
+}
+
+_UNPRODUCTIVE_KEYWORDS = {
+    'courtesy': ('obrigado', 'parabéns', 'felicitações', 'sucesso', 'gratidão'),
+    'informational': ('informação', 'comunicado', 'aviso', 'notificação', 'atualização'),
+    'social': ('aniversário', 'festa', 'evento social', 'confraternização'),
+    'automated': ('automático', 'sistema', 'newsletter', 'boletim', 'relatório automático'),
+    'fyi': ('para conhecimento', 'fyi', 'informativo', 'apenas informando')
+}
+
+# Categorias com peso maior
+_HEAVY_PRODUCTIVE_CATEGORIES = frozenset(('urgency', 'action', 'request'))
+_HEAVY_UNPRODUCTIVE_CATEGORIES = frozenset(('courtesy', 'automated'))
+
+# Padrões de email produtivo
+_PRODUCTIVE_PATTERNS = (
+    r'\b(quando|até quando|prazo|deadline)\b',
+    r'\b(pode|poderia|consegue)\s+\w+',
+    r'\?',  # Emails com perguntas
+    r'\b(solicito|preciso|necessário)\b',
+    r'\b(urgente|importante|prioridade)\b'
+)
+
+# Padrões de email improdutivo
+_UNPRODUCTIVE_PATTERNS = (
+    r'\b(obrigad[oa]|agradec)\w*',
+    r'\b(parabéns|felicitações)\b',
+    r'\b(para conhecimento|fyi)\b',
+    r'\b(newsletter|boletim)\b'
+)
+
+# Modelos de resposta em ordem de prioridade: (palavras-chave, resposta)
+_RESPONSE_TEMPLATES = {
+    # Respostas para emails produtivos
+    EmailClassification.PRODUCTIVE: (
+        (('urgente', 'importante', 'prioridade'),
+         "Obrigado pelo seu email. Entendo a importância e urgência da solicitação. Vou priorizar esta demanda e retornar com uma resposta detalhada o mais breve possível."),
+        (('reunião', 'meeting', 'agenda'),
+         "Obrigado pela solicitação de reunião. Vou verificar minha agenda e retornar com opções de horários que funcionem para ambos. Aguarde meu retorno em breve."),
+        (('pergunta', 'dúvida', 'questão', '?'),
+         "Obrigado pela sua pergunta. Vou analisar os pontos levantados e retornar com uma resposta detalhada. Se precisar de esclarecimentos adicionais, por favor me informe."),
+        (('problema', 'erro', 'bug', 'falha'),
+         "Obrigado por reportar esta questão. Vou investigar o problema imediatamente e trabalhar em uma solução. Manterei você informado sobre o progresso."),
+    ),
+    # Respostas para emails informativos/cortesia
+    EmailClassification.UNPRODUCTIVE: (
+        (('obrigado', 'obrigada', 'agradec'),
+         "De nada! Foi um prazer ajudar. Se precisar de mais alguma coisa, não hesite em entrar em contato."),
+        (('parabéns', 'felicitações'),
+         "Muito obrigado pelas felicitações! Fico feliz em compartilhar esta conquista com você."),
+        (('informação', 'comunicado', 'aviso'),
+         "Obrigado pela informação. Recebi o comunicado e tomarei as ações necessárias conforme apropriado."),
+    ),
+}
+
+_DEFAULT_RESPONSES = {
+    EmailClassification.PRODUCTIVE: "Obrigado pelo seu email. Recebi sua solicitação e vou trabalhar nisso. Retornarei com uma resposta completa em breve.",
+    EmailClassification.UNPRODUCTIVE: "Obrigado pelo seu email. Recebi a informação e fico à disposição se precisar de algo mais.",
+}
+
+
+def _build_keyword_weights() -> Dict[str, Tuple[int, int]]:
+    """Mapeia cada palavra-chave para seus pesos (produtivo, improdutivo)"""
+    weights: Dict[str, Tuple[int, int]] = {}
+    
+    for category, keywords in _PRODUCTIVE_KEYWORDS.items():
+        weight = 3 if category in _HEAVY_PRODUCTIVE_CATEGORIES else 2
+        for keyword in keywords:
+            productive, unproductive = weights.get(keyword, (0, 0))
+            weights[keyword] = (productive + weight, unproductive)
+    
+    for category, keywords in _UNPRODUCTIVE_KEYWORDS.items():
+        weight = 3 if category in _HEAVY_UNPRODUCTIVE_CATEGORIES else 2
+        for keyword in keywords:
+            productive, unproductive = weights.get(keyword, (0, 0))
+            weights[keyword] = (productive, unproductive + weight)
+    
+    return weights
+
+
+def _build_keyword_automaton(weights: Dict[str, Tuple[int, int]]):
+    """Constrói o autômato Aho-Corasick das palavras-chave, se pyahocorasick estiver disponível"""
+    if ahocorasick is None:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for keyword in weights:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+def _build_keyword_regex(weights: Dict[str, Tuple[int, int]]) -> re.Pattern:
+    """Compila a alternação de todas as palavras-chave, da mais longa para a mais curta"""
+    keywords = sorted(weights, key=len, reverse=True)
+    # Lookahead de largura zero: a busca testa todas as posições do texto
+    return re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in keywords) + '))')
+
+
+def _build_keyword_prefixes(weights: Dict[str, Tuple[int, int]]) -> Dict[str, List[str]]:
+    """Mapeia cada palavra-chave para as palavras-chave que são prefixo dela (incluindo ela mesma)"""
+    return {
+        keyword: [other for other in weights if keyword.startswith(other)]
+        for keyword in weights
+    }
+
+
+def _build_response_automaton(templates: Tuple[Tuple[Tuple[str, ...], str], ...]):
+    """Constrói o autômato que mapeia cada palavra-chave à prioridade do seu modelo de resposta"""
+    if ahocorasick is None:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for priority, (keywords, _) in enumerate(templates):
+        for keyword in keywords:
+            # Palavra repetida em mais de um modelo fica com a maior prioridade
+            if not automaton.exists(keyword):
+                automaton.add_word(keyword, priority)
+    automaton.make_automaton()
+    return automaton
+
 
 class EmailClassifierService:
     """Serviço para classificação inteligente de emails"""
     
+    productive_keywords = _PRODUCTIVE_KEYWORDS
+    unproductive_keywords = _UNPRODUCTIVE_KEYWORDS
+    productive_patterns = _PRODUCTIVE_PATTERNS
+    unproductive_patterns = _UNPRODUCTIVE_PATTERNS
+    response_templates = _RESPONSE_TEMPLATES
+    default_responses = _DEFAULT_RESPONSES
+    
+    # Estruturas derivadas, construídas uma única vez e compartilhadas entre instâncias
+    
+    # Peso de cada palavra-chave e autômato para contá-las em uma única passada
+    _keyword_weights = _build_keyword_weights()
+    _keyword_automaton = _build_keyword_automaton(_keyword_weights)
+    
+    # Alternativa sem dependências: uma única regex com todas as palavras-chave
+    _keyword_regex = _build_keyword_regex(_keyword_weights)
+    _keyword_prefixes = _build_keyword_prefixes(_keyword_weights)
+    
+    # Autômatos que encontram todos os modelos aplicáveis em uma única passada
+    _response_automatons = {
+        classification: _build_response_automaton(templates)
+        for classification, templates in _RESPONSE_TEMPLATES.items()
+    }
+    
+    # Padrões compilados uma única vez, reutilizados a cada classificação. São aplicados ao
+    # texto pré-processado, já em minúsculas, então dispensam re.IGNORECASE
+    _productive_regexes = tuple(re.compile(p) for p in _PRODUCTIVE_PATTERNS)
+    _unproductive_regexes = tuple(re.compile(p) for p in _UNPRODUCTIVE_PATTERNS)
+    
     def __init__(self):
         """Inicializa o classificador"""
-        self.productive_keywords = {
-            # Ações diretas
-            'action': ['ação', 'fazer', 'implementar', 'desenvolver', 'criar', 'modificar', 'alterar', 'corrigir'],
-            'urgency': ['urgente', 'importante', 'prioridade', 'deadline', 'prazo', 'imediato'],
-            'request': ['solicito', 'preciso', 'necessário', 'requer', 'pedido', 'solicitação'],
-            'meeting': ['reunião', 'meeting', 'encontro', 'agenda', 'agendamento', 'horário'],
-            'decision': ['decisão', 'aprovar', 'autorizar', 'confirmar', 'validar', 'aceitar'],
-            'problem': ['problema', 'erro', 'bug', 'falha', 'defeito', 'issue'],
-            'question': ['pergunta', 'dúvida', 'questão', 'esclarecimento', 'como', 'quando', 'onde'],
-            'response_needed': ['resposta', 'responder', 'retorno', 'feedback', 'confirmação']
-        }
-        
-        self.unproductive_keywords = {
-            'courtesy': ['obrigado', 'parabéns', 'felicitações', 'sucesso', 'gratidão'],
-            'informational': ['informação', 'comunicado', 'aviso', 'notificação', 'atualização'],
-            'social': ['aniversário', 'festa', 'evento social', 'confraternização'],
-            'automated': ['automático', 'sistema', 'newsletter', 'boletim', 'relatório automático'],
-            'fyi': ['para conhecimento', 'fyi', 'informativo', 'apenas informando']
-        }
-        
-        # Padrões de email produtivo
-        self.productive_patterns = [
-            r'\b(quando|até quando|prazo|deadline)\b',
-            r'\b(pode|poderia|consegue)\s+\w+',
-            r'\?',  # Emails com perguntas
-            r'\b(solicito|preciso|necessário)\b',
-            r'\b(urgente|importante|prioridade)\b'
-        ]
+        # Pipeline scikit-learn pré-treinado (TF-IDF + classificador linear), se disponível
+        self.pipeline = self._load_pipeline()
         
-        # Padrões de email improdutivo
-        self.unproductive_patterns = [
-            r'\b(obrigad[oa]|agradec)\w*',
-            r'\b(parabéns|felicitações)\b',
-            r'\b(para conhecimento|fyi)\b',
-            r'\b(newsletter|boletim)\b'
-        ]
+        # Resultados já calculados, para emails repetidos (respostas automáticas, encaminhamentos)
+        self._results_cache: "OrderedDict[object, ClassificationResult]" = OrderedDict()
+    
+    def _load_pipeline(self):
+        """Carrega o pipeline treinado offline (ver train_classifier.py)"""
+        model_path = settings.classifier_model_path
+        if not model_path:
+            return None
+        
+        if joblib is None:
+            logger.warning("CLASSIFIER_MODEL_PATH configurado, mas scikit-learn/joblib não está instalado")
+            return None
+        
+        if not os.path.exists(model_path):
+            logger.warning(f"Modelo do classificador não encontrado em {model_path}. Usando palavras-chave.")
+            return None
+        
+        try:
+            pipeline = joblib.load(model_path)
+            logger.info(f"Pipeline do classificador carregado de {model_path}")
+            return pipeline
+        except Exception as e:
+            logger.error(f"Erro ao carregar pipeline do classificador: {e}")
+            return None
+    
+    def _iter_keyword_hits(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Percorre o texto uma vez, gerando (índice final, palavra-chave) de cada ocorrência"""
+        if self._keyword_automaton is not None:
+            for end, keyword in self._keyword_automaton.iter(text):
+                yield end, keyword
+            return
+        
+        # A regex só devolve a palavra mais longa em cada posição; as palavras-chave
+        # que são prefixo dela também ocorrem ali
+        for match in self._keyword_regex.finditer(text):
+            start = match.start()
+            for keyword in self._keyword_prefixes[match.group(1)]:
+                yield start + len(keyword) - 1, keyword
     
     def preprocess_text(self, text: str) -> str:
         """Pré-processa o texto do email"""
-        # Remove caracteres especiais e normaliza
-        text = re.sub(r'[^\w\s\?\!]', ' ', text.lower())
-        # Remove espaços extras
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        # Remove caracteres especiais, normaliza e remove espaços extras
+        return _SEPARATOR_RE.sub(' ', text.lower()).strip()
     
     def calculate_keyword_score(self, text: str) -> Tuple[float, float]:
         """Calcula pontuação baseada em palavras-chave"""
         productive_score = 0
         unproductive_score = 0
         
-        # Pontuação para palavras produtivas
-        for category, keywords in self.productive_keywords.items():
-            for keyword in keywords:
-                count = text.count(keyword)
-                if category in ['urgency', 'action', 'request']:
-                    productive_score += count * 3  # Peso maior
-                else:
-                    productive_score += count * 2
-        
-        # Pontuação para palavras improdutivas
-        for category, keywords in self.unproductive_keywords.items():
-            for keyword in keywords:
-                count = text.count(keyword)
-                if category in ['courtesy', 'automated']:
-                    unproductive_score += count * 3  # Peso maior
-                else:
-                    unproductive_score += count * 2
+        # Uma única passada pelo texto; ocorrências sobrepostas da mesma palavra
+        # são ignoradas para manter a contagem de str.count
+        last_end: Dict[str, int] = {}
+        for end, keyword in self._iter_keyword_hits(text):
+            if end - len(keyword) < last_end.get(keyword, -1):
+                continue
+            last_end[keyword] = end
+            productive, unproductive = self._keyword_weights[keyword]
+            productive_score += productive
+            unproductive_score += unproductive
         
         return productive_score, unproductive_score
     
     def calculate_pattern_score(self, text: str) -> Tuple[float, float]:
         """Calcula pontuação baseada em padrões regex"""
-        productive_score = 0
-        unproductive_score = 0
-        
-        # Padrões produtivos
-        for pattern in self.productive_patterns:
-            matches = len(re.findall(pattern, text, re.IGNORECASE))
-            productive_score += matches * 2
-        
-        # Padrões improdutivos
-        for pattern in self.unproductive_patterns:
-            matches = len(re.findall(pattern, text, re.IGNORECASE))
-            unproductive_score += matches * 2
-        
-        return productive_score, unproductive_score
+        return (
+            self._pattern_score(self._productive_regexes, text),
+            self._pattern_score(self._unproductive_regexes, text),
+        )
+    
+    def _pattern_score(self, regexes: Tuple[re.Pattern, ...], text: str) -> int:
+        """Soma 2 pontos por ocorrência de cada padrão do grupo"""
+        return 2 * sum(len(pattern.findall(text)) for pattern in regexes)
     
     def analyze_structure(self, text: str) -> float:
         """Analisa a estrutura do email"""
-        score = 0
-        
+        return self._structure_score(text, len(text.split()))
+    
+    def _structure_score(self, text: str, word_count: int) -> int:
+        """Pontuação da estrutura a partir das perguntas e da quantidade de palavras"""
         # Presença de perguntas aumenta a chance de ser produtivo
-        question_marks = text.count('?')
-        score += question_marks * 2
-        
+        return text.count('?') * 2 + self._length_score(word_count)
+    
+    def _length_score(self, word_count: int) -> int:
+        """Ajuste da pontuação pela quantidade de palavras do email"""
         # Emails muito curtos tendem a ser menos produtivos
-        if len(text.split()) < 20:
-            score -= 1
+        if word_count < 20:
+            return -1
         
         # Emails muito longos podem ser mais informativos
-        if len(text.split()) > 200:
-            score += 1
+        if word_count > 200:
+            return 1
+        
+        return 0
+    
+    def _score_text(self, content: str) -> Tuple[float, float]:
+        """Calcula as pontuações (produtiva, improdutiva); na saída antecipada, a produtiva é só um limite inferior"""
+        # Pré-processamento
+        processed_text = self.preprocess_text(content)
+        
+        # Cálculo de pontuações
+        keyword_productive, keyword_unproductive = self.calculate_keyword_score(processed_text)
+        
+        # Padrões só somam à pontuação produtiva e a estrutura subtrai no máximo 1: se o limite
+        # inferior da pontuação produtiva já garante a confiança máxima, o resultado não depende deles.
+        # Retorna esse limite, e não o total: só é equivalente porque a confiança é limitada a 0.95
+        # (classify_text e _classify_rules_batch dependem disso)
+        if 0.6 + (keyword_productive - 1 - keyword_unproductive) * 0.05 >= 0.95:
+            return keyword_productive - 1, keyword_unproductive
+        
+        # Só os padrões produtivos entram no total, e o texto pré-processado tem palavras
+        # separadas por um único espaço, então não é preciso dividi-lo para contá-las
+        pattern_productive = self._pattern_score(self._productive_regexes, processed_text)
+        word_count = processed_text.count(' ') + 1 if processed_text else 0
+        structure_score = self._structure_score(processed_text, word_count)
+        
+        # Pontuação total
+        return keyword_productive + pattern_productive + structure_score, keyword_unproductive
+    
+    def classify_text(self, content: str) -> Tuple[EmailClassification, float]:
+        """Classifica um texto pelas regras de palavras-chave, padrões e estrutura"""
+        total_productive, total_unproductive = self._score_text(content)
+        
+        # Classificação
+        if total_productive > total_unproductive:
+            classification = EmailClassification.PRODUCTIVE
+            confidence = min(0.95, 0.6 + (total_productive - total_unproductive) * 0.05)
+        else:
+            classification = EmailClassification.UNPRODUCTIVE
+            confidence = min(0.95, 0.6 + (total_unproductive - total_productive) * 0.05)
+        
+        # Garantir confiança mínima
+        return classification, max(0.5, confidence)
+    
+    def classify_batch(self, texts: List[str]) -> List[Tuple[EmailClassification, float]]:
+        """Classifica vários textos de uma vez, usando o pipeline treinado quando disponível"""
+        if self.pipeline is None:
+            return self._classify_rules_batch(texts)
+        
+        # Uma única chamada vetorizada para todo o lote; a distância da margem
+        # passa por uma sigmoide para virar confiança
+        scores = self.pipeline.decision_function(texts)
+        confidences = 1.0 / (1.0 + np.exp(-np.abs(scores)))
+        negative_label, positive_label = self.pipeline.classes_
         
-        return score
+        return [
+            (EmailClassification(positive_label if score > 0 else negative_label), float(confidence))
+            for score, confidence in zip(scores, confidences)
+        ]
+    
+    def _cache_key(self, content: str) -> object:
+        """Chave do cache de resultados: o próprio conteúdo ou, se longo, seu hash"""
+        if len(content) <= CACHE_KEY_MAX_LENGTH:
+            return content
+        return hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    
+    def analyze_batch(self, texts: List[str]) -> List[ClassificationResult]:
+        """Classifica e gera a resposta sugerida de cada texto, reaproveitando resultados memorizados"""
+        keys = [self._cache_key(text) for text in texts]
+        results: List[Optional[ClassificationResult]] = [self._results_cache.get(key) for key in keys]
+        
+        # Classificar de uma só vez apenas os textos ainda não memorizados
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            classified = self.classify_batch([texts[i] for i in missing])
+            for i, (classification, confidence) in zip(missing, classified):
+                results[i] = (classification, confidence, self._generate_response(classification, texts[i]))
+        
+        for key, result in zip(keys, results):
+            self._results_cache[key] = result
+            self._results_cache.move_to_end(key)
+        while len(self._results_cache) > CLASSIFICATION_CACHE_SIZE:
+            self._results_cache.popitem(last=False)
+        
+        return results
+    
+    def _classify_rules_batch(self, texts: List[str]) -> List[Tuple[EmailClassification, float]]:
+        """Classifica um lote pelas regras, calculando as confianças de forma vetorizada"""
+        if np is None or len(texts) < 2:
+            return [self.classify_text(text) for text in texts]
+        
+        # Mesma fórmula de classify_text, aplicada a todo o lote de uma vez
+        scores = np.array([self._score_text(text) for text in texts], dtype=np.float64)
+        differences = scores[:, 0] - scores[:, 1]
+        confidences = np.maximum(0.5, np.minimum(0.95, 0.6 + np.abs(differences) * 0.05))
+        
+        return [
+            (EmailClassification.PRODUCTIVE if difference > 0 else EmailClassification.UNPRODUCTIVE, float(confidence))
+            for difference, confidence in zip(differences.tolist(), confidences.tolist())
+        ]
     
     def classify_email(self, content: str, file_name: str = None) -> EmailAnalysisResponse:
         """Classifica um email e gera resposta sugerida"""
         try:
-            # Pré-processamento
-            processed_text = self.preprocess_text(content)
-            
-            # Cálculo de pontuações
-            keyword_productive, keyword_unproductive = self.calculate_keyword_score(processed_text)
-            pattern_productive, pattern_unproductive = self.calculate_pattern_score(processed_text)
-            structure_score = self.analyze_structure(processed_text)
+            classification, confidence, suggested_response = self.analyze_batch([content])[0]
+            return self._build_response(classification, confidence, suggested_response, file_name)
             
-            # Pontuação total
-            total_productive = keyword_productive + pattern_productive + structure_score
-            total_unproductive = keyword_unproductive
-            
-            # Classificação
-            if total_productive > total_unproductive:
-                classification = EmailClassification.PRODUCTIVE
-                confidence = min(0.95, 0.6 + (total_productive - total_unproductive) * 0.05)
-            else:
-                classification = EmailClassification.UNPRODUCTIVE
-                confidence = min(0.95, 0.6 + (total_unproductive - total_productive) * 0.05)
-            
-            # Garantir confiança mínima
-            confidence = max(0.5, confidence)
-            
-            # Gerar resposta sugerida
-            suggested_response = self._generate_response(classification, content)
-            
-            # Criar resposta
+        except Exception as e:
+            logger.error(f"Erro na classificação do email: {str(e)}")
+            return self._build_emergency_response(file_name)
+    
+    def classify_emails(self, items: List[Tuple[str, Optional[str]]]) -> List[EmailAnalysisResponse]:
+        """Classifica um lote de emails com uma única inferência"""
+        try:
+            results = self.analyze_batch([content for content, _ in items])
+        except Exception as e:
+            logger.error(f"Erro na classificação em lote: {str(e)}")
+            return [self.classify_email(content, file_name) for content, file_name in items]
+        
+        return [
+            self._build_response(classification, confidence, suggested_response, file_name)
+            for (_, file_name), (classification, confidence, suggested_response) in zip(items, results)
+        ]
+    
+    def _build_response(
+        self,
+        classification: EmailClassification,
+        confidence: float,
+        suggested_response: str,
+        file_name: Optional[str],
+    ) -> EmailAnalysisResponse:
+        """Monta a resposta da análise com a resposta sugerida"""
+        try:
+            # Criar resposta (id e horário novos a cada análise)
             analysis_id = str(uuid.uuid4())
             
             return EmailAnalysisResponse(
@@ -160,56 +439,48 @@ class EmailClassifierService:
                 classification=classification,
                 confidence=round(confidence, 2),
                 suggested_response=suggested_response,
-                analysis_timestamp=datetime.now(),
+                analysis_timestamp=datetime.utcnow(),
                 file_name=file_name
             )
             
         except Exception as e:
             logger.error(f"Erro na classificação do email: {str(e)}")
-            # Resposta padrão em caso de erro
-            return EmailAnalysisResponse(
-                id=str(uuid.uuid4()),
-                classification=EmailClassification.UNPRODUCTIVE,
-                confidence=0.5,
-                suggested_response="Obrigado pelo seu email. Analisaremos o conteúdo e retornaremos em breve.",
-                analysis_timestamp=datetime.now(),
-                file_name=file_name
-            )
+            return self._build_emergency_response(file_name)
+    
+    def _build_emergency_response(self, file_name: Optional[str]) -> EmailAnalysisResponse:
+        """Resposta padrão em caso de erro"""
+        return EmailAnalysisResponse(
+            id=str(uuid.uuid4()),
+            classification=EmailClassification.UNPRODUCTIVE,
+            confidence=0.5,
+            suggested_response="Obrigado pelo seu email. Analisaremos o conteúdo e retornaremos em breve.",
+            analysis_timestamp=datetime.utcnow(),
+            file_name=file_name
+        ).mark_degraded()
     
     def _generate_response(self, classification: EmailClassification, content: str) -> str:
         """Gera resposta automática baseada na classificação"""
         content_lower = content.lower()
+        templates = self.response_templates[classification]
+        automaton = self._response_automatons[classification]
         
-        if classification == EmailClassification.PRODUCTIVE:
-            # Respostas para emails produtivos
-            if any(word in content_lower for word in ['urgente', 'importante', 'prioridade']):
-                return "Obrigado pelo seu email. Entendo a importância e urgência da solicitação. Vou priorizar esta demanda e retornar com uma resposta detalhada o mais breve possível."
-            
-            elif any(word in content_lower for word in ['reunião', 'meeting', 'agenda']):
-                return "Obrigado pela solicitação de reunião. Vou verificar minha agenda e retornar com opções de horários que funcionem para ambos. Aguarde meu retorno em breve."
-            
-            elif any(word in content_lower for word in ['pergunta', 'dúvida', 'questão', '?']):
-                return "Obrigado pela sua pergunta. Vou analisar os pontos levantados e retornar com uma resposta detalhada. Se precisar de esclarecimentos adicionais, por favor me informe."
-            
-            elif any(word in content_lower for word in ['problema', 'erro', 'bug', 'falha']):
-                return "Obrigado por reportar esta questão. Vou investigar o problema imediatamente e trabalhar em uma solução. Manterei você informado sobre o progresso."
-            
-            else:
-                return "Obrigado pelo seu email. Recebi sua solicitação e vou trabalhar nisso. Retornarei com uma resposta completa em breve."
+        if automaton is None:
+            for keywords, response in templates:
+                if any(word in content_lower for word in keywords):
+                    return response
+            return self.default_responses[classification]
         
-        else:
-            # Respostas para emails informativos/cortesia
-            if any(word in content_lower for word in ['obrigado', 'obrigada', 'agradec']):
-                return "De nada! Foi um prazer ajudar. Se precisar de mais alguma coisa, não hesite em entrar em contato."
-            
-            elif any(word in content_lower for word in ['parabéns', 'felicitações']):
-                return "Muito obrigado pelas felicitações! Fico feliz em compartilhar esta conquista com você."
-            
-            elif any(word in content_lower for word in ['informação', 'comunicado', 'aviso']):
-                return "Obrigado pela informação. Recebi o comunicado e tomarei as ações necessárias conforme apropriado."
-            
-            else:
-                return "Obrigado pelo seu email. Recebi a informação e fico à disposição se precisar de algo mais."
+        # Uma única passada pelo texto; vence o modelo de maior prioridade encontrado
+        best = len(templates)
+        for _, priority in automaton.iter(content_lower):
+            if priority < best:
+                best = priority
+                if best == 0:
+                    break
+        
+        if best < len(templates):
+            return templates[best][1]
+        return self.default_responses[classification]
 
 
 # Instância global do serviço
@@ -0,0 +1,154 @@
+"""
+Serviço de micro-batching das requisições de classificação
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from ..models.schemas import EmailAnalysisResponse
+from ..core.config import settings
+from .openai_classifier import openai_classifier
+from .ai_classifier import email_classifier
+
+logger = logging.getLogger(__name__)
+
+BatchItem = Tuple[str, Optional[str]]
+QueueItem = Tuple[str, Optional[str], asyncio.Future]
+BatchHandler = Callable[[List[BatchItem]], Awaitable[List[EmailAnalysisResponse]]]
+
+
+class AsyncBatcher:
+    """Agrupa requisições concorrentes em lotes processados de uma só vez"""
+
+    def __init__(self, handler: BatchHandler, max_batch_size: int, max_latency_ms: int, max_batch_chars: int):
+        """Inicializa o batcher"""
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max(0, max_latency_ms) / 1000
+        self.max_batch_chars = max_batch_chars
+        self._queue: Optional[asyncio.Queue] = None
+        self._overflow: Optional[QueueItem] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Inicia a tarefa de agrupamento em background (idempotente)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect())
+
+    async def stop(self) -> None:
+        """Encerra a tarefa de agrupamento e aguarda os lotes em andamento"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def submit(self, content: str, file_name: Optional[str] = None) -> EmailAnalysisResponse:
+        """Enfileira um email e aguarda o resultado do lote em que foi incluído"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((content, file_name, future))
+        return await future
+
+    async def _collect(self) -> None:
+        """Coleta itens até atingir o tamanho máximo do lote (emails ou caracteres) ou a latência máxima"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if self._overflow is not None:
+                item, self._overflow = self._overflow, None
+            else:
+                item = await self._queue.get()
+            batch = [item]
+            batch_chars = len(item[0])
+            deadline = loop.time() + self.max_latency
+
+            while len(batch) < self.max_batch_size:
+                # Incluir imediatamente o que já está na fila
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+
+                # Um email que estouraria o limite de caracteres abre o próximo lote
+                if batch_chars + len(item[0]) > self.max_batch_chars:
+                    self._overflow = item
+                    break
+                batch.append(item)
+                batch_chars += len(item[0])
+
+            # Processar o lote sem bloquear a coleta do próximo
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+            # Cancelar a chamada se todas as requisições do lote forem canceladas
+            futures = [future for _, _, future in batch]
+            for future in futures:
+                future.add_done_callback(
+                    lambda _, task=task, futures=futures: self._cancel_if_abandoned(task, futures)
+                )
+
+    def _cancel_if_abandoned(self, task: asyncio.Task, futures: List[asyncio.Future]) -> None:
+        """Cancela o processamento de um lote cujas requisições foram todas canceladas"""
+        if not task.done() and all(future.cancelled() for future in futures):
+            task.cancel()
+
+    async def _dispatch(self, batch: List[QueueItem]) -> None:
+        """Processa um lote e resolve o future de cada requisição"""
+        # Ignorar requisições que já foram canceladas
+        pending = [item for item in batch if not item[2].done()]
+        if not pending:
+            return
+
+        try:
+            results = await self.handler([(content, file_name) for content, file_name, _ in pending])
+            if len(results) != len(pending):
+                raise ValueError("Quantidade de resultados diferente do tamanho do lote")
+        except Exception as e:
+            logger.error("Erro ao processar lote de %d emails: %s", len(pending), e)
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def _classify_local_batch(items: List[BatchItem]) -> List[EmailAnalysisResponse]:
+    """Classifica um lote com o classificador local"""
+    return email_classifier.classify_emails(items)
+
+
+# Instâncias globais do serviço
+batcher = AsyncBatcher(
+    openai_classifier.classify_batch,
+    max_batch_size=settings.max_batch_size,
+    max_latency_ms=settings.max_batch_latency_ms,
+    max_batch_chars=settings.max_batch_chars,
+)
+
+# O classificador local é rápido: não espera por novas requisições, apenas
+# agrupa as que se acumularam na fila enquanto o lote anterior era processado
+local_batcher = AsyncBatcher(
+    _classify_local_batch,
+    max_batch_size=settings.max_batch_size,
+    max_latency_ms=0,
+    max_batch_chars=settings.max_batch_chars,
+)
@@ -0,0 +1,54 @@
+"""
+Serviço de cache das respostas de classificação
+"""
+import hashlib
+import logging
+from typing import Optional
+
+from ..models.schemas import EmailAnalysisResponse
+from ..core.config import settings
+from ..core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheService:
+    """Cache Redis de classificações indexado pelo hash do conteúdo do email"""
+
+    def __init__(self):
+        self.ttl = settings.cache_ttl_seconds
+
+    def build_key(self, content: str, model: str) -> str:
+        """Monta a chave do cache a partir do conteúdo e do modelo usado"""
+        digest = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+        return f"ec:{digest}:{model}"
+
+    async def get(self, content: str, model: str) -> Optional[EmailAnalysisResponse]:
+        """Recupera uma classificação previamente armazenada"""
+        redis = get_redis()
+        if redis is None:
+            return None
+
+        try:
+            cached = await redis.get(self.build_key(content, model))
+            if cached:
+                return EmailAnalysisResponse.model_validate_json(cached)
+        except Exception as e:
+            logger.warning("Erro ao consultar cache: %s", e)
+
+        return None
+
+    async def set(self, content: str, model: str, analysis: EmailAnalysisResponse) -> None:
+        """Armazena uma classificação no cache"""
+        redis = get_redis()
+        if redis is None:
+            return
+
+        try:
+            await redis.set(self.build_key(content, model), analysis.model_dump_json(), ex=self.ttl)
+        except Exception as e:
+            logger.warning("Erro ao gravar cache: %s", e)
+
+
+# Instância global do serviço
+response_cache = ResponseCacheService()
@@ -1,23 +1,89 @@
 """
-Serviço de armazenamento de dados em memória
+Serviço de armazenamento de dados (em memória ou Redis)
 """
+import asyncio
+import bisect
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime
-from collections import defaultdict
+from abc import ABC, abstractmethod
+from typing import List, Deque, Dict, Optional, Any, Tuple
+from datetime import datetime, timedelta
+from collections import defaultdict, deque
+from itertools import islice
 
 from ..models.schemas import EmailAnalysisResponse, EmailHistory, StatsResponse, EmailClassification
+from ..core.config import settings
+from ..core.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
+# (análise, conteúdo original) aguardando gravação
+PendingAnalysis = Tuple[EmailAnalysisResponse, str]
 
-class DataStorageService:
-    """Serviço para armazenar dados em memória (pode ser expandido para banco de dados)"""
+
+class BaseDataStorageService(ABC):
+    """Comportamento comum aos backends de armazenamento"""
+    
+    def start(self) -> None:
+        """Inicia as tarefas em background do backend, se houver"""
+    
+    async def stop(self) -> None:
+        """Encerra as tarefas em background do backend, se houver"""
+    
+    async def store_analysis(self, analysis: EmailAnalysisResponse, content: str = "") -> None:
+        """Armazena uma análise de email"""
+        await self._store_batch([(analysis, content)])
+    
+    @abstractmethod
+    async def _store_batch(self, items: List[PendingAnalysis]) -> None:
+        """Grava um lote de análises no backend"""
+    
+    def _build_history_item(self, analysis: EmailAnalysisResponse, content: str) -> EmailHistory:
+        """Monta o item de histórico (com conteúdo truncado) de uma análise"""
+        return EmailHistory(
+            id=analysis.id,
+            content=self._truncate_content(content),
+            classification=analysis.classification,
+            confidence=analysis.confidence,
+            suggested_response=analysis.suggested_response,
+            analysis_timestamp=analysis.analysis_timestamp,
+            file_name=analysis.file_name
+        )
+    
+    def _truncate_content(self, content: str, max_length: int = 200) -> str:
+        """Trunca conteúdo para exibição no histórico"""
+        if len(content) <= max_length:
+            return content
+        
+        # Truncar e adicionar reticências
+        truncated = content[:max_length]
+        last_space = truncated.rfind(' ')
+        
+        if last_space > max_length * 0.8:
+            truncated = truncated[:last_space]
+        
+        return truncated + "..."
+
+
+class DataStorageService(BaseDataStorageService):
+    """Serviço para armazenar dados em memória (usado quando o Redis não está configurado)"""
+    
+    MAX_WRITE_BATCH = 100  # Máximo de análises gravadas de uma só vez
     
     def __init__(self):
         """Inicializa o armazenamento em memória"""
+        # Fila de gravação, iniciada junto com a aplicação: a requisição só enfileira a análise
+        self._pending: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
         self._analyses: Dict[str, EmailAnalysisResponse] = {}
-        self._history: List[EmailHistory] = []
+        # Apenas os últimos 100 itens; os mais antigos são descartados no append
+        self._history: Deque[EmailHistory] = deque(maxlen=100)
+        # Os mesmos itens do histórico, separados por classificação
+        self._history_by_class: Dict[EmailClassification, Deque[EmailHistory]] = {
+            classification: deque() for classification in EmailClassification
+        }
+        # Maior horário de análise até cada posição do histórico (sempre crescente,
+        # mesmo que as análises sejam armazenadas fora de ordem), para busca binária
+        self._history_max_timestamps: Deque[datetime] = deque(maxlen=100)
         self._stats = {
             'total_processed': 0,
             'productive_count': 0,
@@ -25,28 +91,92 @@ class DataStorageService:
             'total_confidence': 0.0
         }
     
-    def store_analysis(self, analysis: EmailAnalysisResponse, content: str = "") -> None:
+    def start(self) -> None:
+        """Inicia a tarefa que grava as análises em background (idempotente)"""
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+    
+    async def stop(self) -> None:
+        """Aguarda a gravação das análises pendentes e encerra a tarefa de gravação"""
+        if self._writer is None:
+            return
+        
+        if not self._writer.done():
+            await self._pending.join()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+        await self._flush_pending()
+    
+    async def store_analysis(self, analysis: EmailAnalysisResponse, content: str = "") -> None:
+        """Armazena uma análise de email fora do caminho da requisição"""
+        if self._writer is None or self._writer.done():
+            # Sem a tarefa de gravação (ex.: fora da aplicação), gravar imediatamente
+            await self._store_batch([(analysis, content)])
+            return
+        
+        self._pending.put_nowait((analysis, content))
+    
+    async def _write_pending(self) -> None:
+        """Grava em lotes as análises enfileiradas"""
+        while True:
+            items = [await self._pending.get()]
+            while len(items) < self.MAX_WRITE_BATCH and not self._pending.empty():
+                items.append(self._pending.get_nowait())
+            
+            try:
+                await self._store_batch(items)
+            except Exception as e:
+                logger.error("Erro ao gravar lote de %d análises: %s", len(items), e)
+            finally:
+                for _ in items:
+                    self._pending.task_done()
+    
+    async def _flush_pending(self) -> None:
+        """Grava imediatamente o que estiver na fila, para que as leituras vejam as últimas análises"""
+        if self._pending is None or self._pending.empty():
+            return
+        
+        items = []
+        while not self._pending.empty():
+            items.append(self._pending.get_nowait())
+        try:
+            await self._store_batch(items)
+        finally:
+            for _ in items:
+                self._pending.task_done()
+    
+    async def _store_batch(self, items: List[PendingAnalysis]) -> None:
+        """Armazena um lote de análises de email"""
+        for analysis, content in items:
+            self._store_analysis(analysis, content)
+    
+    def _store_analysis(self, analysis: EmailAnalysisResponse, content: str) -> None:
         """Armazena uma análise de email"""
         try:
             # Armazenar análise completa
             self._analyses[analysis.id] = analysis
             
             # Atualizar histórico (com conteúdo truncado)
-            history_item = EmailHistory(
-                id=analysis.id,
-                content=self._truncate_content(content),
-                classification=analysis.classification,
-                confidence=analysis.confidence,
-                suggested_response=analysis.suggested_response,
-                analysis_timestamp=analysis.analysis_timestamp,
-                file_name=analysis.file_name
-            )
+            history_item = self._build_history_item(analysis, content)
+            
+            # O item mais antigo sai do histórico e também do seu grupo
+            if len(self._history) == self._history.maxlen:
+                evicted = self._history[0]
+                self._history_by_class[evicted.classification].popleft()
             
             self._history.append(history_item)
+            self._history_by_class[history_item.classification].append(history_item)
             
-            # Manter apenas os últimos 100 itens no histórico
-            if len(self._history) > 100:
-                self._history = self._history[-100:]
+            timestamp = history_item.analysis_timestamp
+            if self._history_max_timestamps:
+                timestamp = max(timestamp, self._history_max_timestamps[-1])
+            self._history_max_timestamps.append(timestamp)
             
             # Atualizar estatísticas
             self._update_stats(analysis)
@@ -56,17 +186,23 @@ class DataStorageService:
         except Exception as e:
             logger.error(f"Erro ao armazenar análise {analysis.id}: {str(e)}")
     
-    def get_analysis(self, analysis_id: str) -> Optional[EmailAnalysisResponse]:
+    async def get_analysis(self, analysis_id: str) -> Optional[EmailAnalysisResponse]:
         """Recupera uma análise específica por ID"""
+        await self._flush_pending()
         return self._analyses.get(analysis_id)
     
-    def get_history(self, limit: int = 50) -> List[EmailHistory]:
-        """Recupera o histórico de análises"""
-        # Retorna em ordem reversa (mais recentes primeiro)
-        return list(reversed(self._history[-limit:]))
+    async def get_history(
+        self, limit: int = 50, classification: Optional[EmailClassification] = None
+    ) -> List[EmailHistory]:
+        """Recupera o histórico de análises, opcionalmente filtrado por classificação"""
+        await self._flush_pending()
+        # Percorre dos mais recentes para os mais antigos, parando ao atingir o limite
+        items = self._history if classification is None else self._history_by_class[classification]
+        return list(islice(reversed(items), max(limit, 0)))
     
-    def get_stats(self) -> StatsResponse:
+    async def get_stats(self) -> StatsResponse:
         """Recupera estatísticas do sistema"""
+        await self._flush_pending()
         average_confidence = 0.0
         if self._stats['total_processed'] > 0:
             average_confidence = self._stats['total_confidence'] / self._stats['total_processed']
@@ -78,11 +214,15 @@ class DataStorageService:
             average_confidence=round(average_confidence, 2)
         )
     
-    def clear_history(self) -> bool:
+    async def clear_history(self) -> bool:
         """Limpa todo o histórico e estatísticas"""
+        await self._flush_pending()
         try:
             self._analyses.clear()
             self._history.clear()
+            for items in self._history_by_class.values():
+                items.clear()
+            self._history_max_timestamps.clear()
             self._stats = {
                 'total_processed': 0,
                 'productive_count': 0,
@@ -105,37 +245,166 @@ class DataStorageService:
         else:
             self._stats['unproductive_count'] += 1
     
-    def _truncate_content(self, content: str, max_length: int = 200) -> str:
-        """Trunca conteúdo para exibição no histórico"""
-        if len(content) <= max_length:
-            return content
+    async def get_analysis_by_classification(self, classification: EmailClassification) -> List[EmailHistory]:
+        """Recupera análises filtradas por classificação"""
+        await self._flush_pending()
+        return list(self._history_by_class[classification])
+    
+    async def get_recent_analyses(self, hours: int = 24) -> List[EmailHistory]:
+        """Recupera análises das últimas N horas"""
+        await self._flush_pending()
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         
-        # Truncar e adicionar reticências
-        truncated = content[:max_length]
-        last_space = truncated.rfind(' ')
+        # Tudo antes desta posição é anterior ao corte; depois dela, só é preciso
+        # conferir os itens armazenados fora de ordem
+        start = bisect.bisect_left(self._history_max_timestamps, cutoff_time)
+        return [
+            item for item in islice(self._history, start, None)
+            if item.analysis_timestamp >= cutoff_time
+        ]
+
+
+class RedisDataStorageService(BaseDataStorageService):
+    """Serviço para armazenar dados no Redis, compartilhados entre workers"""
+    
+    HISTORY_KEY = "history"
+    STATS_KEY = "stats"
+    HISTORY_LIMIT = 100  # Mesmo limite do histórico em memória
+    
+    def __init__(self, redis: Any):
+        """Inicializa o armazenamento com um cliente Redis assíncrono"""
+        self._redis = redis
+    
+    def _analysis_key(self, analysis_id: str) -> str:
+        return f"analysis:{analysis_id}"
+    
+    def _history_item_key(self, analysis_id: str) -> str:
+        return f"history:item:{analysis_id}"
+    
+    def _classification_key(self, classification: EmailClassification) -> str:
+        return f"history:{classification.value}"
+    
+    async def _store_batch(self, items: List[PendingAnalysis]) -> None:
+        """Armazena um lote de análises e atualiza as estatísticas atomicamente, em uma única ida ao Redis"""
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                for analysis, content in items:
+                    self._queue_analysis(pipe, analysis, content)
+                # Retirar do histórico, na mesma transação, os itens além do limite
+                pipe.zrange(self.HISTORY_KEY, 0, -(self.HISTORY_LIMIT + 1))
+                pipe.zremrangebyrank(self.HISTORY_KEY, 0, -(self.HISTORY_LIMIT + 1))
+                results = await pipe.execute()
+            
+            evicted = results[-2]
+            if evicted:
+                await self._evict_history_items(evicted)
+            
+            logger.info(f"{len(items)} análises armazenadas com sucesso")
+            
+        except Exception as e:
+            logger.error(f"Erro ao armazenar {len(items)} análises: {str(e)}")
+    
+    def _queue_analysis(self, pipe: Any, analysis: EmailAnalysisResponse, content: str) -> None:
+        """Adiciona ao pipeline os comandos que gravam uma análise"""
+        history_item = self._build_history_item(analysis, content)
+        score = analysis.analysis_timestamp.timestamp()
         
-        if last_space > max_length * 0.8:
-            truncated = truncated[:last_space]
+        pipe.set(self._analysis_key(analysis.id), analysis.model_dump_json(), ex=settings.analysis_ttl_seconds)
+        pipe.set(self._history_item_key(analysis.id), history_item.model_dump_json())
+        pipe.zadd(self.HISTORY_KEY, {analysis.id: score})
+        pipe.zadd(self._classification_key(analysis.classification), {analysis.id: score})
+        pipe.hincrby(self.STATS_KEY, "total", 1)
+        pipe.hincrby(self.STATS_KEY, analysis.classification.value, 1)
+        pipe.hincrbyfloat(self.STATS_KEY, "sum_conf", analysis.confidence)
+    
+    async def _evict_history_items(self, ids: List[str]) -> None:
+        """Remove dos grupos por classificação os itens que saíram do histórico e apaga seus dados"""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for classification in EmailClassification:
+                pipe.zrem(self._classification_key(classification), *ids)
+            pipe.delete(*(self._history_item_key(analysis_id) for analysis_id in ids))
+            await pipe.execute()
+    
+    async def get_analysis(self, analysis_id: str) -> Optional[EmailAnalysisResponse]:
+        """Recupera uma análise específica por ID"""
+        data = await self._redis.get(self._analysis_key(analysis_id))
+        return EmailAnalysisResponse.model_validate_json(data) if data else None
+    
+    async def get_history(
+        self, limit: int = 50, classification: Optional[EmailClassification] = None
+    ) -> List[EmailHistory]:
+        """Recupera o histórico de análises (mais recentes primeiro), opcionalmente filtrado"""
+        if limit <= 0:
+            return []
         
-        return truncated + "..."
+        key = self._classification_key(classification) if classification else self.HISTORY_KEY
+        ids = await self._redis.zrevrange(key, 0, limit - 1)
+        return await self._load_history_items(ids)
+    
+    async def get_stats(self) -> StatsResponse:
+        """Recupera estatísticas do sistema"""
+        total, productive, unproductive, sum_conf = await self._redis.hmget(
+            self.STATS_KEY, "total", "productive", "unproductive", "sum_conf"
+        )
+        total = int(total or 0)
+        
+        average_confidence = 0.0
+        if total > 0:
+            average_confidence = float(sum_conf or 0.0) / total
+        
+        return StatsResponse(
+            total_processed=total,
+            productive_count=int(productive or 0),
+            unproductive_count=int(unproductive or 0),
+            average_confidence=round(average_confidence, 2)
+        )
     
-    def get_analysis_by_classification(self, classification: EmailClassification) -> List[EmailHistory]:
+    async def clear_history(self) -> bool:
+        """Limpa todo o histórico e estatísticas"""
+        try:
+            ids = await self._redis.zrange(self.HISTORY_KEY, 0, -1)
+            keys = [self.HISTORY_KEY, self.STATS_KEY]
+            keys.extend(self._classification_key(c) for c in EmailClassification)
+            keys.extend(self._history_item_key(analysis_id) for analysis_id in ids)
+            # Análises antigas continuam disponíveis (com TTL) após sair do histórico
+            keys.extend([key async for key in self._redis.scan_iter(match=self._analysis_key("*"), count=500)])
+            
+            await self._redis.delete(*keys)
+            logger.info("Histórico e estatísticas limpos com sucesso")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao limpar histórico: {str(e)}")
+            return False
+    
+    async def get_analysis_by_classification(self, classification: EmailClassification) -> List[EmailHistory]:
         """Recupera análises filtradas por classificação"""
-        return [
-            item for item in self._history 
-            if item.classification == classification
-        ]
+        ids = await self._redis.zrange(self._classification_key(classification), 0, -1)
+        return await self._load_history_items(ids)
     
-    def get_recent_analyses(self, hours: int = 24) -> List[EmailHistory]:
+    async def get_recent_analyses(self, hours: int = 24) -> List[EmailHistory]:
         """Recupera análises das últimas N horas"""
-        from datetime import timedelta
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+        ids = await self._redis.zrangebyscore(self.HISTORY_KEY, cutoff_time.timestamp(), "+inf")
+        return await self._load_history_items(ids)
+    
+    async def _load_history_items(self, ids: List[str]) -> List[EmailHistory]:
+        """Carrega os itens de histórico na ordem dos IDs informados"""
+        if not ids:
+            return []
         
-        return [
-            item for item in self._history 
-            if item.analysis_timestamp >= cutoff_time
-        ]
+        items = await self._redis.mget([self._history_item_key(analysis_id) for analysis_id in ids])
+        return [EmailHistory.model_validate_json(item) for item in items if item]
+
+
+def _create_data_storage() -> BaseDataStorageService:
+    """Escolhe o backend de armazenamento conforme a configuração"""
+    redis = get_redis()
+    if redis is not None:
+        logger.info("Usando Redis para histórico e estatísticas")
+        return RedisDataStorageService(redis)
+    
+    return DataStorageService()
 
 
 # Instância global do serviço
-data_storage = DataStorageService()
+data_storage = _create_data_storage()
@@ -1,11 +1,12 @@
 """
 Serviço para processamento de arquivos
 """
-import PyPDF2
-import io
+import asyncio
+import codecs
 import logging
-from typing import Tuple
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from pypdf import PdfReader
 
 from ..core.config import settings
 
@@ -15,18 +16,24 @@ logger = logging.getLogger(__name__)
 class FileProcessorService:
     """Serviço para processar uploads de arquivos"""
     
+    CHUNK_SIZE = 64 * 1024  # Tamanho dos blocos lidos do upload
+    TEXT_ENCODING = 'utf-8-sig'  # UTF-8, descartando o BOM se presente
+    FALLBACK_ENCODING = 'latin-1'  # Usada quando o arquivo não é UTF-8 válido
+    
     def __init__(self):
         self.max_file_size = settings.max_file_size
         self.allowed_extensions = settings.allowed_file_types
     
     def validate_file(self, file: UploadFile) -> None:
         """Valida arquivo enviado"""
-        # Verificar tamanho do arquivo
-        if hasattr(file, 'size') and file.size and file.size > self.max_file_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Arquivo muito grande. Tamanho máximo permitido: {self.max_file_size / (1024*1024):.1f}MB"
-            )
+        # Verificar tamanho do arquivo (antes de qualquer leitura)
+        if hasattr(file, 'size') and file.size is not None:
+            if file.size == 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Arquivo vazio"
+                )
+            self._ensure_size_limit(file.size)
         
         # Verificar extensão
         if file.filename:
@@ -37,28 +44,22 @@ class FileProcessorService:
                     detail=f"Tipo de arquivo não suportado. Tipos permitidos: {', '.join(self.allowed_extensions)}"
                 )
     
-    async def extract_text_from_file(self, file: UploadFile) -> Tuple[str, str]:
-        """Extrai texto do arquivo enviado"""
+    async def extract_text_from_file(self, file: UploadFile, max_chars: Optional[int] = None) -> Tuple[str, str]:
+        """Extrai texto do arquivo enviado, parando de ler após max_chars caracteres"""
         try:
             self.validate_file(file)
             
-            file_content = await file.read()
             file_extension = file.filename.split('.')[-1].lower() if file.filename else 'txt'
             
             if file_extension == 'txt':
-                # Processar arquivo TXT
-                try:
-                    text = file_content.decode('utf-8')
-                except UnicodeDecodeError:
-                    # Tentar outras codificações
-                    try:
-                        text = file_content.decode('latin-1')
-                    except UnicodeDecodeError:
-                        text = file_content.decode('utf-8', errors='ignore')
+                # Processar arquivo TXT em blocos, sem carregar o upload inteiro na memória
+                text = await self._read_text(file, max_chars)
                 return text, file.filename or 'arquivo.txt'
             elif file_extension == 'pdf':
-                # Processar arquivo PDF
-                text = self._extract_text_from_pdf(file_content)
+                # Processar arquivo PDF direto do arquivo temporário do upload,
+                # fora do event loop (parsing é CPU-bound)
+                self._ensure_size_limit(self._stream_size(file.file))
+                text = await asyncio.to_thread(self._extract_text_from_pdf, file.file, max_chars)
                 return text, file.filename or 'arquivo.pdf'
             else:
                 raise HTTPException(
@@ -74,20 +75,96 @@ class FileProcessorService:
                 detail="Erro interno ao processar arquivo"
             )
     
-    def _extract_text_from_pdf(self, pdf_content: bytes) -> str:
-        """Extrai texto de arquivo PDF"""
+    async def _read_text(self, file: UploadFile, max_chars: Optional[int] = None) -> str:
+        """Lê e decodifica um arquivo de texto em blocos, abortando se exceder o tamanho máximo"""
+        decoder = codecs.getincrementaldecoder(self.TEXT_ENCODING)()
+        fallback = False
+        head = b''  # Primeiros bytes do arquivo, para saber se o decodificador descartou um BOM
+        parts = []
+        size = 0
+        chars = 0
+        
+        while chunk := await file.read(self.CHUNK_SIZE):
+            size += len(chunk)
+            self._ensure_size_limit(size)
+            if fallback:
+                text = decoder.decode(chunk)
+            else:
+                pending, _ = decoder.getstate()
+                try:
+                    text = decoder.decode(chunk)
+                except UnicodeDecodeError:
+                    # Não é UTF-8: redecodificar o que já foi lido, sem reler o upload
+                    fallback = True
+                    decoder = codecs.getincrementaldecoder(self.FALLBACK_ENCODING)()
+                    text = decoder.decode(self._encode_read_text(parts, pending, head) + chunk)
+                    parts = []
+                    chars = 0
+                if len(head) < len(codecs.BOM_UTF8):
+                    head += chunk[:len(codecs.BOM_UTF8) - len(head)]
+            parts.append(text)
+            chars += len(text)
+            
+            # O restante seria descartado pelo truncamento da análise
+            if max_chars is not None and chars > max_chars:
+                return ''.join(parts)
+        
+        if fallback:
+            return ''.join(parts)
+        
+        pending, bom_undecided = decoder.getstate()
+        try:
+            # O decodificador utf-8-sig não sinaliza um BOM incompleto no fim do arquivo
+            if pending and bom_undecided:
+                raise UnicodeDecodeError(self.TEXT_ENCODING, pending, 0, len(pending), "BOM incompleto")
+            parts.append(decoder.decode(b'', final=True))
+        except UnicodeDecodeError:
+            # Sequência UTF-8 incompleta no fim do arquivo
+            return self._encode_read_text(parts, pending, head).decode(self.FALLBACK_ENCODING)
+        return ''.join(parts)
+    
+    def _encode_read_text(self, parts: List[str], pending: bytes, head: bytes) -> bytes:
+        """Recupera os bytes já lidos a partir do texto decodificado como UTF-8 e dos bytes pendentes"""
+        # O BOM descartado pelo decodificador não aparece no texto e precisa ser restaurado
+        bom = codecs.BOM_UTF8 if head == codecs.BOM_UTF8 else b''
+        return bom + ''.join(parts).encode('utf-8') + pending
+    
+    def _stream_size(self, stream: BinaryIO) -> int:
+        """Retorna o tamanho de um arquivo seekable sem lê-lo"""
+        size = stream.seek(0, 2)
+        stream.seek(0)
+        return size
+    
+    def _ensure_size_limit(self, size: int) -> None:
+        """Rejeita arquivos maiores que o tamanho máximo permitido"""
+        if size > self.max_file_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo muito grande. Tamanho máximo permitido: {self.max_file_size / (1024*1024):.1f}MB"
+            )
+    
+    def _extract_text_from_pdf(self, pdf_file: BinaryIO, max_chars: Optional[int] = None) -> str:
+        """Extrai texto de arquivo PDF, parando nas páginas que excedem max_chars"""
         try:
-            pdf_file = io.BytesIO(pdf_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            pdf_reader = PdfReader(pdf_file)
             text_content = []
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text_content.append(page.extract_text())
+            chars = 0
+            for page in pdf_reader.pages:
+                # Limpar e normalizar o texto da página
+                page_text = (page.extract_text() or '').replace('\x00', '')
+                page_text = ' '.join(page_text.split())
+                if not page_text:
+                    continue
+                
+                text_content.append(page_text)
+                chars += len(page_text) + 1  # Texto da página e o espaço que a separa da próxima
+                
+                # Não extrair páginas que seriam descartadas pelo truncamento da análise
+                # (só quando o texto unido, sem o último espaço, já excede o limite)
+                if max_chars is not None and chars - 1 > max_chars:
+                    break
             # Juntar todo o texto
-            full_text = '\n'.join(text_content)
-            # Limpar e normalizar o texto
-            full_text = full_text.replace('\x00', '')
-            full_text = ' '.join(full_text.split())
+            full_text = ' '.join(text_content)
             if not full_text.strip():
                 raise HTTPException(
                     status_code=400,
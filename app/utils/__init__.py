@@ -2,5 +2,7 @@
 Utilities module
 """
 
+from .responses import UTCORJSONResponse
+
 
 
@@ -0,0 +1,22 @@
+"""
+Classes de resposta HTTP compartilhadas
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+class UTCORJSONResponse(ORJSONResponse):
+    """ORJSONResponse que serializa datetimes (UTC ingênuos) com sufixo Z, em código nativo"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            option=(
+                orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NAIVE_UTC
+                | orjson.OPT_UTC_Z
+            ),
+        )
@@ -5,11 +5,24 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
+from uvicorn.workers import UvicornWorker
+
+from app.core.config import settings
+
+
+class UvloopWorker(UvicornWorker):
+    """Worker do Uvicorn com o event loop e o parser HTTP configurados (uvloop e httptools por padrão)"""
+    CONFIG_KWARGS = {"loop": settings.server_loop, "http": settings.server_http}
+
+
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
-workers = 1
-worker_class = "uvicorn.workers.UvicornWorker"
+# Cada worker roda seu próprio event loop. Com REDIS_URL, (2 x núcleos) + 1 workers por padrão;
+# sem Redis, um único worker (ver WORKERS/WEB_CONCURRENCY e Settings.get_worker_count)
+workers = settings.get_worker_count()
+worker_class = UvloopWorker
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
 timeout = 120
 keepalive = 5
+preload_app = True
@@ -7,10 +7,17 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
 from app.main import app
+from app.core.config import settings
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 8000)),
+        loop=settings.server_loop,
+        http=settings.server_http
+    )
 
 
 
@@ -20,6 +20,9 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
+        workers=None if settings.debug else settings.get_worker_count(),
+        loop=settings.server_loop,
+        http=settings.server_http,
         log_level=settings.log_level.lower(),
         access_log=True
     )
@@ -11,8 +11,15 @@ os.environ.setdefault('PYTHONPATH', current_dir)
 
 if __name__ == "__main__":
     from app.main import app
+    from app.core.config import settings
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        loop=settings.server_loop,
+        http=settings.server_http
+    )
 
 
 
@@ -0,0 +1,71 @@
+"""
+Testes do cancelamento da classificação quando o cliente desconecta
+"""
+import asyncio
+import importlib
+
+import orjson
+
+from app.main import app
+
+endpoints = importlib.import_module('app.api.endpoints')
+
+
+def test_analyze_is_cancelled_when_client_disconnects(monkeypatch):
+    state = {}
+
+    async def slow_classify(content, file_name):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state['cancelled'] = True
+            raise
+
+    monkeypatch.setattr(endpoints, '_classify_content', slow_classify)
+    monkeypatch.setattr(endpoints, 'DISCONNECT_POLL_INTERVAL', 0.01)
+
+    body = orjson.dumps({'content': 'Preciso de ajuda com o relatório do sistema, por favor.'})
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': '/api/v1/analyze',
+        'raw_path': b'/api/v1/analyze',
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def run():
+        # O cliente envia o corpo e fecha a conexão logo em seguida
+        disconnect_at = asyncio.get_running_loop().time() + 0.1
+        requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            # Como no uvicorn, a desconexão já ocorrida é entregue sem bloquear
+            if requests:
+                return requests.pop(0)
+            delay = disconnect_at - asyncio.get_running_loop().time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        await asyncio.wait_for(app(scope, receive, send), timeout=2)
+
+    asyncio.run(run())
+
+    assert state.get('cancelled') is True
+    assert messages[0]['type'] == 'http.response.start'
+    assert messages[0]['status'] == endpoints.CLIENT_CLOSED_REQUEST
@@ -0,0 +1,68 @@
+"""
+Testes da leitura incremental de arquivos de texto
+"""
+import asyncio
+import codecs
+
+import pytest
+
+from app.services.file_processor import FileProcessorService
+
+
+class FakeUpload:
+    """Upload em memória que entrega o conteúdo em blocos"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self.data) if size < 0 else self.position + size
+        chunk = self.data[self.position:end]
+        self.position += len(chunk)
+        return chunk
+
+
+def expected_text(data: bytes) -> str:
+    """Decodificação do arquivo inteiro de uma só vez"""
+    try:
+        return data.decode(FileProcessorService.TEXT_ENCODING)
+    except UnicodeDecodeError:
+        return data.decode(FileProcessorService.FALLBACK_ENCODING)
+
+
+def read_text(data: bytes, chunk_size: int) -> str:
+    processor = FileProcessorService()
+    processor.CHUNK_SIZE = chunk_size
+    return asyncio.run(processor._read_text(FakeUpload(data)))
+
+
+SAMPLES = [
+    b'',
+    'Reunião amanhã às 10h? \U0001F600'.encode('utf-8'),
+    codecs.BOM_UTF8 + 'Solicitação de suporte'.encode('utf-8'),
+    codecs.BOM_UTF8 + 'Solicitação'.encode('utf-8') + b' \xe9 latin-1',
+    'Relatório'.encode('utf-8') + b' pend\xeancia',
+    'Relatório em anexo'.encode('latin-1'),
+    'Fim truncado ç'.encode('utf-8')[:-1],
+    codecs.BOM_UTF8,
+    codecs.BOM_UTF8[:2],
+    codecs.BOM_UTF8[:1],
+    codecs.BOM_UTF8[:2] + b'abc',
+    codecs.BOM_UTF8 + b'\xff',
+]
+
+
+@pytest.mark.parametrize('data', SAMPLES)
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 64 * 1024])
+def test_read_text_matches_whole_file_decoding(data, chunk_size):
+    assert read_text(data, chunk_size) == expected_text(data)
+
+
+def test_read_text_keeps_bom_in_latin1_fallback():
+    data = codecs.BOM_UTF8 + b'ol\xe1'
+    assert read_text(data, 2) == 'ï»¿olá'
+
+
+def test_read_text_decodes_partial_bom_as_latin1():
+    assert read_text(b'\xef\xbb', 1) == 'ï»'
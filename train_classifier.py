@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Treina offline o pipeline TF-IDF + LinearSVC usado pelo classificador local
+
+Uso: python train_classifier.py dados.csv [modelo.joblib]
+
+O CSV deve conter as colunas "text" e "label" (productive/unproductive).
+Aponte CLASSIFIER_MODEL_PATH para o arquivo gerado.
+"""
+import csv
+import os
+import sys
+
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from app.core.config import settings
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    data_path = sys.argv[1]
+    model_path = sys.argv[2] if len(sys.argv) > 2 else (settings.classifier_model_path or "classifier.joblib")
+
+    with open(data_path, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    texts = [row["text"] for row in rows]
+    labels = [row["label"] for row in rows]
+
+    pipeline = Pipeline([
+        ("tfidf", TfidfVectorizer(lowercase=True, ngram_range=(1, 2), sublinear_tf=True)),
+        ("clf", LinearSVC()),
+    ])
+    pipeline.fit(texts, labels)
+
+    joblib.dump(pipeline, model_path)
+    print(f"Pipeline treinado com {len(texts)} exemplos e salvo em {model_path}")
+
+
+if __name__ == "__main__":
+    main()